@@ -1,6 +1,9 @@
+import hashlib
+import random
+import socket
 import struct
 import time
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
 
 MAINNET_MAGIC = 0xD9B4BEF9
 TESTNET_MAGIC = 0x0709110B
@@ -8,11 +11,33 @@ REGTEST_MAGIC = 0xDAB5BFFA
 
 PROTOCOL_VERSION = 70015
 
+HEADER_SIZE = 24
+MAX_PAYLOAD_SIZE = 2 * 1024 * 1024
+
 MSG_VERSION = b'version\x00\x00\x00\x00\x00'
 MSG_VERACK = b'verack\x00\x00\x00\x00\x00\x00'
 MSG_GETADDR = b'getaddr\x00\x00\x00\x00\x00'
 MSG_ADDR = b'addr\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 
+_CMD_TAG = {
+    MSG_VERSION: b'version',
+    MSG_VERACK: b'verack',
+    MSG_GETADDR: b'getaddr',
+    MSG_ADDR: b'addr',
+}
+
+_sha256 = hashlib.sha256
+_EMPTY_CHECKSUM = b'\x5d\xf6\xe0\xe2'
+_VARINT_LEN = bytes([1] * 0xFD + [3, 5, 9])
+_V4MAPPED_PREFIX = b'\x00' * 10 + b'\xff\xff'
+_ADDR_ENTRY = struct.Struct('<IQ12s4s2s')
+
+_U16_BE = struct.Struct('>H')
+_U32_LE = struct.Struct('<I')
+_U64_LE = struct.Struct('<Q')
+_HDR = struct.Struct('<I12sI4s')
+_VERSION_PREFIX = struct.Struct('<IQQ')
+
 
 def varint_encode(value: int) -> bytes:
     if value < 0xFD:
@@ -30,32 +55,31 @@ def varint_decode(data: bytes, offset: int = 0) -> Tuple[int, int]:
         raise ValueError("Insufficient data for varint")
     
     first_byte = data[offset]
-    
-    if first_byte < 0xFD:
+    size = _VARINT_LEN[first_byte]
+    if size == 1:
         return first_byte, offset + 1
-    elif first_byte == 0xFD:
-        if offset + 3 > len(data):
-            raise ValueError("Insufficient data for varint")
-        value = struct.unpack('<H', data[offset + 1:offset + 3])[0]
-        return value, offset + 3
-    elif first_byte == 0xFE:
-        if offset + 5 > len(data):
-            raise ValueError("Insufficient data for varint")
-        value = struct.unpack('<I', data[offset + 1:offset + 5])[0]
-        return value, offset + 5
-    else:
-        if offset + 9 > len(data):
-            raise ValueError("Insufficient data for varint")
-        value = struct.unpack('<Q', data[offset + 1:offset + 9])[0]
-        return value, offset + 9
+    
+    end = offset + size
+    if end > len(data):
+        raise ValueError("Insufficient data for varint")
+    return int.from_bytes(data[offset + 1:end], 'little'), end
+
+
+def message_checksum(payload: bytes) -> bytes:
+    if not payload:
+        return _EMPTY_CHECKSUM
+    return _sha256(_sha256(payload).digest()).digest()[:4]
 
 
 def create_message(command: bytes, payload: bytes, magic: int = MAINNET_MAGIC) -> bytes:
     command_padded = command[:12].ljust(12, b'\x00')
     length = len(payload)
-    import hashlib
-    checksum = hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
-    return struct.pack('<I', magic) + command_padded + struct.pack('<I', length) + checksum + payload
+    checksum = message_checksum(payload)
+    return _HDR.pack(magic, command_padded, length, checksum) + payload
+
+
+VERACK_FRAME = create_message(MSG_VERACK, b'')
+GETADDR_FRAME = create_message(MSG_GETADDR, b'')
 
 
 def create_version_message(
@@ -73,33 +97,60 @@ def create_version_message(
         timestamp = int(time.time())
     
     if nonce is None:
-        import random
         nonce = random.getrandbits(64)
     
     def encode_ip(ip: str, port: int) -> bytes:
-        ip_parts = [int(x) for x in ip.split('.')]
-        ipv6_format = bytes([0x00] * 10 + [0xFF, 0xFF] + ip_parts)
-        return struct.pack('<Q', services) + ipv6_format + struct.pack('>H', port)
+        return _U64_LE.pack(services) + _V4MAPPED_PREFIX + socket.inet_aton(ip) + _U16_BE.pack(port)
     
-    payload = struct.pack('<I', version)
-    payload += struct.pack('<Q', services)
-    payload += struct.pack('<Q', timestamp)
+    payload = _VERSION_PREFIX.pack(version, services, timestamp)
     payload += encode_ip(addr_recv[0], addr_recv[1])
     payload += encode_ip(addr_from[0], addr_from[1])
-    payload += struct.pack('<Q', nonce)
+    payload += _U64_LE.pack(nonce)
     payload += varint_encode(len(user_agent)) + user_agent.encode('utf-8')
-    payload += struct.pack('<I', start_height)
+    payload += _U32_LE.pack(start_height)
     payload += struct.pack('<?', relay)
     
     return create_message(MSG_VERSION, payload)
 
 
 def create_verack_message() -> bytes:
-    return create_message(MSG_VERACK, b'')
+    return VERACK_FRAME
 
 
 def create_getaddr_message() -> bytes:
-    return create_message(MSG_GETADDR, b'')
+    return GETADDR_FRAME
+
+
+def parse_version_payload(payload: bytes) -> dict:
+    try:
+        if len(payload) < _VERSION_PREFIX.size:
+            if len(payload) < 4:
+                return {}
+            version = _U32_LE.unpack_from(payload, 0)[0]
+            if len(payload) < 12:
+                return {'version': version}
+            return {'version': version, 'services': _U64_LE.unpack_from(payload, 4)[0]}
+        
+        version, services, timestamp = _VERSION_PREFIX.unpack_from(payload, 0)
+        offset = _VERSION_PREFIX.size + 26 + 26 + 8
+        
+        user_agent = ''
+        if offset < len(payload):
+            try:
+                ua_len, offset = varint_decode(payload, offset)
+                if offset + ua_len <= len(payload):
+                    user_agent = payload[offset:offset + ua_len].decode('utf-8', errors='ignore')
+            except ValueError:
+                pass
+        
+        return {
+            'version': version,
+            'services': services,
+            'timestamp': timestamp,
+            'user_agent': user_agent
+        }
+    except Exception:
+        return {}
 
 
 def parse_addr_message(data: bytes) -> List[Tuple[str, int, int]]:
@@ -108,59 +159,44 @@ def parse_addr_message(data: bytes) -> List[Tuple[str, int, int]]:
     
     try:
         count, offset = varint_decode(data, 0)
-        addresses = []
+        count = min(count, 1000, (len(data) - offset) // _ADDR_ENTRY.size)
+        records = data[offset:offset + count * _ADDR_ENTRY.size]
         
-        for _ in range(min(count, 1000)):
-            if offset + 30 > len(data):
-                break
-            
-            timestamp = struct.unpack('<I', data[offset:offset + 4])[0]
-            offset += 4
-            services = struct.unpack('<Q', data[offset:offset + 8])[0]
-            offset += 8
-            
-            ip_bytes = data[offset:offset + 16]
-            offset += 16
-            
-            if ip_bytes[:12] == bytes(12) and ip_bytes[12:14] == b'\xFF\xFF':
-                ip = '.'.join(str(b) for b in ip_bytes[14:18])
-            else:
-                offset += 2
-                continue
-            
-            port = struct.unpack('>H', data[offset:offset + 2])[0]
-            offset += 2
-            
-            addresses.append((ip, port, timestamp))
-        
-        return addresses
+        return [
+            (socket.inet_ntoa(ipv4), int.from_bytes(port, 'big'), timestamp)
+            for timestamp, _, prefix, ipv4, port in _ADDR_ENTRY.iter_unpack(records)
+            if prefix == _V4MAPPED_PREFIX
+        ]
     except (ValueError, struct.error, IndexError):
         return []
 
 
-def parse_message(data: bytes) -> Optional[Tuple[bytes, bytes]]:
-    if len(data) < 24:
+def parse_header(data: Union[bytes, bytearray, memoryview]) -> Optional[Tuple[bytes, int, bytes]]:
+    magic, command, length, checksum = _HDR.unpack_from(data, 0)
+    if magic != MAINNET_MAGIC:
         return None
     
-    magic = struct.unpack('<I', data[0:4])[0]
-    if magic != MAINNET_MAGIC:
+    if length > MAX_PAYLOAD_SIZE:
         return None
     
-    command = data[4:16].rstrip(b'\x00')
-    length = struct.unpack('<I', data[16:20])[0]
-    checksum = data[20:24]
+    return (_CMD_TAG.get(command) or command.rstrip(b'\x00'), length, checksum)
+
+
+def parse_message(data: Union[bytes, bytearray, memoryview]) -> Optional[Tuple[bytes, bytes]]:
+    if len(data) < HEADER_SIZE:
+        return None
     
-    if length > 2 * 1024 * 1024:
+    header = parse_header(data)
+    if not header:
         return None
     
-    if len(data) < 24 + length:
+    command, length, checksum = header
+    if len(data) < HEADER_SIZE + length:
         return None
     
-    payload = data[24:24 + length]
+    payload = bytes(data[HEADER_SIZE:HEADER_SIZE + length])
     
-    import hashlib
-    calculated_checksum = hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
-    if calculated_checksum != checksum:
+    if message_checksum(payload) != checksum:
         return None
     
     return (command, payload)
@@ -5,14 +5,16 @@ import time
 import logging
 import sys
 import os
-import socket
 
 backend_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, backend_dir)
 
-from crawler import BitcoinNodeCrawler
+from crawler import BitcoinNodeCrawler, install_event_loop_policy
 from database import NodeDatabase
+from dns_seeds import DNS_CACHE_TTL, parse_node_address, resolve_seed
 from geolocation import IPGeolocator
+from geo_cache import GeoCache
+from http_session import get_session, close_session, read_json_keys
 
 BITCOIN_SEED_NODES = [
     ("seed.bitcoin.sipa.be", 8333),
@@ -26,41 +28,32 @@ BITCOIN_SEED_NODES = [
     ("seed.bitcoin.wiz.biz", 8333),
 ]
 
-
-def resolve_dns_seeds():
+async def resolve_dns_seeds():
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *[resolve_seed(loop, hostname, port, ttl=DNS_CACHE_TTL) for hostname, port in BITCOIN_SEED_NODES],
+        return_exceptions=True
+    )
+    
     resolved_nodes = []
-    for hostname, port in BITCOIN_SEED_NODES:
-        try:
-            try:
-                addrinfo = socket.getaddrinfo(hostname, port, socket.AF_INET)
-                for info in addrinfo:
-                    ip = info[4][0]
-                    resolved_nodes.append((ip, port))
-            except:
-                ip = socket.gethostbyname(hostname)
-                resolved_nodes.append((ip, port))
-        except socket.gaierror:
-            pass
-    return resolved_nodes
+    for (hostname, port), ips in zip(BITCOIN_SEED_NODES, results):
+        if isinstance(ips, Exception):
+            continue
+        resolved_nodes.extend((ip, port) for ip in ips)
+    return list(dict.fromkeys(resolved_nodes))
 
 
 async def fetch_bitnodes_seeds(max_nodes: int = 200):
     try:
         import aiohttp
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get('https://bitnodes.io/api/v1/snapshots/latest/', timeout=aiohttp.ClientTimeout(total=15)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        nodes = []
-                        for node_info in list(data.get('nodes', {}).keys())[:max_nodes]:
-                            if ':' in node_info:
-                                ip, port = node_info.split(':')
-                                if ip and port:
-                                    nodes.append((ip, int(port)))
-                        return nodes
-            except:
-                pass
+        session = await get_session()
+        try:
+            async with session.get('https://bitnodes.io/api/v1/snapshots/latest/', timeout=aiohttp.ClientTimeout(total=15)) as resp:
+                if resp.status == 200:
+                    node_list = await read_json_keys(resp, 'nodes', max_nodes)
+                    return [node for node in map(parse_node_address, node_list) if node]
+        except:
+            pass
     except:
         pass
     return []
@@ -69,9 +62,46 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-async def crawl_batch(max_nodes: int = 50, max_concurrent: int = 50):
+async def geolocate_and_store(node_queue: asyncio.Queue, geolocator: IPGeolocator, db: NodeDatabase, batch_size: int = 50, flush_interval: float = 1.0):
+    nodes_with_location = 0
+    batch = []
+    finished = False
+    
+    while not finished:
+        timed_out = False
+        try:
+            node = await asyncio.wait_for(node_queue.get(), timeout=flush_interval)
+            if node is None:
+                finished = True
+            else:
+                batch.append(node)
+        except asyncio.TimeoutError:
+            timed_out = True
+        
+        if not batch or not (finished or timed_out or len(batch) >= batch_size):
+            continue
+        
+        by_ip = {}
+        for node in batch:
+            by_ip.setdefault(node['ip'], []).append(node)
+        logger.info(f"Getting geolocation for {len(by_ip)} unique IPs")
+        location_data = await geolocator.get_locations_batch(list(by_ip))
+        
+        for ip, location in location_data.items():
+            if location:
+                for node in by_ip[ip]:
+                    node.update(location)
+                nodes_with_location += len(by_ip[ip])
+        
+        await asyncio.to_thread(db.insert_nodes_batch, batch)
+        batch = []
+    
+    return nodes_with_location
+
+
+async def crawl_batch(db: NodeDatabase, geolocator: IPGeolocator, max_nodes: int = 50, max_concurrent: int = 50):
     try:
-        seed_nodes = resolve_dns_seeds()
+        seed_nodes = await resolve_dns_seeds()
         
         try:
             bitnodes_seeds = await fetch_bitnodes_seeds(max_nodes=200)
@@ -85,40 +115,34 @@ async def crawl_batch(max_nodes: int = 50, max_concurrent: int = 50):
             logger.warning("No seed nodes available")
             return 0
         
+        seed_nodes = list(dict.fromkeys(seed_nodes))
+        
         crawler = BitcoinNodeCrawler(
             max_concurrent=max_concurrent,
             timeout=8.0
         )
         
+        node_queue = asyncio.Queue()
+        
         logger.info(f"Crawling up to {max_nodes} nodes...")
-        nodes_data = await crawler.crawl(seed_nodes, max_nodes=max_nodes)
+        store_task = asyncio.create_task(geolocate_and_store(node_queue, geolocator, db))
+        try:
+            nodes_data = await crawler.crawl(seed_nodes, max_nodes=max_nodes, node_queue=node_queue)
+            await node_queue.put(None)
+            nodes_with_location = await store_task
+        finally:
+            if not store_task.done():
+                store_task.cancel()
+                await asyncio.gather(store_task, return_exceptions=True)
         
         if not nodes_data:
             logger.warning("No nodes were crawled")
             return 0
         
         logger.info(f"Crawled {len(nodes_data)} nodes")
-        
-        unique_ips = list(set(node['ip'] for node in nodes_data))
-        logger.info(f"Getting geolocation for {len(unique_ips)} unique IPs")
-        
-        async with IPGeolocator(rate_limit=0.1) as geolocator:
-            location_data = await geolocator.get_locations_batch(unique_ips, max_concurrent=5)
-        
-        for node in nodes_data:
-            ip = node['ip']
-            location = location_data.get(ip)
-            if location:
-                node.update(location)
-        
-        nodes_with_location = sum(1 for node in nodes_data if node.get('latitude'))
         logger.info(f"Got geolocation for {nodes_with_location} nodes")
         
-        db_path = os.path.join(backend_dir, 'bitcoin_nodes.db')
-        db = NodeDatabase(db_path)
-        db.insert_nodes_batch(nodes_data)
-        
-        stats = db.get_statistics()
+        stats = await asyncio.to_thread(db.get_statistics)
         logger.info(f"✓ Database now has {stats['total_nodes']} total nodes ({stats['nodes_with_location']} with location)")
         
         return len(nodes_data)
@@ -136,6 +160,11 @@ async def main():
     logger.info("Press Ctrl+C to stop")
     logger.info("=" * 60)
     
+    db_path = os.path.join(backend_dir, 'bitcoin_nodes.db')
+    db = NodeDatabase(db_path)
+    geo_cache = GeoCache(db_path)
+    geolocator = IPGeolocator(rate_limit=0.1, cache=geo_cache)
+    
     iteration = 0
     try:
         while True:
@@ -143,7 +172,7 @@ async def main():
             logger.info(f"\n--- Crawl iteration #{iteration} ---")
             
             start_time = time.time()
-            nodes_crawled = await crawl_batch(max_nodes=50, max_concurrent=50)
+            nodes_crawled = await crawl_batch(db, geolocator, max_nodes=50, max_concurrent=50)
             elapsed = time.time() - start_time
             
             logger.info(f"Crawled {nodes_crawled} nodes in {elapsed:.1f} seconds")
@@ -161,8 +190,13 @@ async def main():
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        await close_session()
+        geo_cache.close()
+        db.close()
 
 
 if __name__ == "__main__":
+    install_event_loop_policy()
     asyncio.run(main())
 
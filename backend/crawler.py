@@ -1,5 +1,6 @@
 import asyncio
 import socket
+import struct
 import ipaddress
 from typing import Set, List, Tuple, Optional
 from datetime import datetime
@@ -7,23 +8,78 @@ import logging
 
 from bitcoin_protocol import (
     create_version_message,
-    create_verack_message,
-    create_getaddr_message,
+    message_checksum,
     parse_addr_message,
-    parse_message,
-    MAINNET_MAGIC
+    parse_header,
+    parse_version_payload,
+    HEADER_SIZE,
+    MAINNET_MAGIC,
+    VERACK_FRAME,
+    GETADDR_FRAME
 )
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+def install_event_loop_policy():
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+
+_IPV4_U32 = struct.Struct('>I')
+_PRIVATE_IPV4 = tuple(
+    (int(network.network_address), int(network.netmask))
+    for network in map(ipaddress.IPv4Network, (
+        '0.0.0.0/8',
+        '10.0.0.0/8',
+        '127.0.0.0/8',
+        '169.254.0.0/16',
+        '172.16.0.0/12',
+        '192.0.0.0/29',
+        '192.0.0.170/31',
+        '192.0.2.0/24',
+        '192.168.0.0/16',
+        '198.18.0.0/15',
+        '198.51.100.0/24',
+        '203.0.113.0/24',
+        '240.0.0.0/4',
+    ))
+)
+
+
 def is_private_ip(ip: str) -> bool:
     try:
-        ip_obj = ipaddress.ip_address(ip)
-        return ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local
-    except ValueError:
-        return True
+        ip_u32 = _IPV4_U32.unpack(socket.inet_aton(ip))[0]
+    except OSError:
+        try:
+            ip_obj = ipaddress.ip_address(ip)
+            return ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local
+        except ValueError:
+            return True
+    
+    for network, mask in _PRIVATE_IPV4:
+        if ip_u32 & mask == network:
+            return True
+    return False
+
+
+async def _read_frame(reader: asyncio.StreamReader, timeout: float) -> Optional[Tuple[bytes, bytes]]:
+    header = parse_header(await asyncio.wait_for(reader.readexactly(HEADER_SIZE), timeout))
+    if not header:
+        return None
+    
+    command, length, checksum = header
+    payload = await asyncio.wait_for(reader.readexactly(length), timeout)
+    if message_checksum(payload) != checksum:
+        return None
+    
+    return command, payload
 
 
 class BitcoinNodeCrawler:
@@ -33,15 +89,32 @@ class BitcoinNodeCrawler:
         self.semaphore = asyncio.Semaphore(max_concurrent)
         self.discovered_nodes: Set[Tuple[str, int]] = set()
         self.crawled_nodes: Set[Tuple[str, int]] = set()
+        self._seen: Set[Tuple[str, int]] = set()
         self.node_data: List[dict] = []
         self.failed_nodes: Set[Tuple[str, int]] = set()
         
+    async def _collect_addr(self, reader: asyncio.StreamReader, new_peers: List[Tuple[str, int, int]]):
+        while True:
+            frame = await _read_frame(reader, self.timeout)
+            if not frame:
+                return
+            
+            cmd, payload = frame
+            if cmd == b'addr':
+                peers = parse_addr_message(payload)
+                if peers:
+                    new_peers.extend(peers)
+                    logger.debug(f"Parsed {len(peers)} peers from ADDR message")
+                if len(peers) > 1:
+                    return
+    
     async def connect_to_node(self, ip: str, port: int) -> Optional[dict]:
         async with self.semaphore:
             if (ip, port) in self.crawled_nodes:
                 return None
             
             self.crawled_nodes.add((ip, port))
+            self._seen.add((ip, port))
             
             try:
                 reader, writer = await asyncio.wait_for(
@@ -54,107 +127,36 @@ class BitcoinNodeCrawler:
                 await writer.drain()
                 
                 try:
-                    response = await asyncio.wait_for(
-                        reader.read(1024),
-                        timeout=self.timeout
-                    )
-                    
-                    if not response:
-                        writer.close()
-                        await writer.wait_closed()
-                        return None
-                    
-                    msg = parse_message(response)
+                    msg = await _read_frame(reader, self.timeout)
                     if not msg or msg[0] != b'version':
                         writer.close()
                         await writer.wait_closed()
                         return None
                     
-                    verack_msg = create_verack_message()
-                    writer.write(verack_msg)
+                    writer.writelines((VERACK_FRAME, GETADDR_FRAME))
                     await writer.drain()
                     
-                    verack_response = await asyncio.wait_for(
-                        reader.read(1024),
-                        timeout=self.timeout
-                    )
-                    
-                    if not verack_response:
-                        writer.close()
-                        await writer.wait_closed()
-                        return None
+                    frame = await _read_frame(reader, self.timeout)
+                    while frame and frame[0] != b'verack':
+                        frame = await _read_frame(reader, self.timeout)
                     
-                    verack_msg_parsed = parse_message(verack_response)
-                    if not verack_msg_parsed or verack_msg_parsed[0] != b'verack':
+                    if not frame:
                         writer.close()
                         await writer.wait_closed()
                         return None
                     
-                    getaddr_msg = create_getaddr_message()
-                    writer.write(getaddr_msg)
-                    await writer.drain()
-                    
                     new_peers = []
-                    addr_data = b''
-                    attempts = 0
-                    max_attempts = 8
-                    
-                    await asyncio.sleep(0.3)
-                    
-                    while attempts < max_attempts:
-                        try:
-                            chunk = await asyncio.wait_for(
-                                reader.read(16384),
-                                timeout=1.5
-                            )
-                            if not chunk:
-                                attempts += 1
-                                await asyncio.sleep(0.2)
-                                continue
-                            addr_data += chunk
-                            
-                            offset = 0
-                            while offset < len(addr_data):
-                                msg_parsed = parse_message(addr_data[offset:])
-                                if msg_parsed:
-                                    cmd, payload = msg_parsed
-                                    if cmd == b'addr':
-                                        peers = parse_addr_message(payload)
-                                        if peers:
-                                            new_peers.extend(peers)
-                                            logger.debug(f"Parsed {len(peers)} peers from ADDR message")
-                                        offset += 24 + len(payload)
-                                    else:
-                                        msg_len = 24 + len(payload)
-                                        offset += msg_len
-                                else:
-                                    break
-                            
-                            if new_peers and attempts >= 2:
-                                break
-                                
-                            attempts += 1
-                            await asyncio.sleep(0.2)
-                        except asyncio.TimeoutError:
-                            attempts += 1
-                            if attempts < max_attempts:
-                                await asyncio.sleep(0.2)
-                            continue
-                        except Exception as e:
-                            logger.debug(f"Error reading ADDR response from {ip}:{port}: {e}")
-                            break
+                    try:
+                        await asyncio.wait_for(
+                            self._collect_addr(reader, new_peers),
+                            timeout=self.timeout
+                        )
+                    except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                        pass
+                    except Exception as e:
+                        logger.debug(f"Error reading ADDR response from {ip}:{port}: {e}")
                     
-                    if addr_data and not new_peers:
-                        for start_offset in [0, 24, 48]:
-                            if start_offset < len(addr_data):
-                                addr_msg = parse_message(addr_data[start_offset:])
-                                if addr_msg and addr_msg[0] == b'addr':
-                                    peers = parse_addr_message(addr_msg[1])
-                                    if peers:
-                                        new_peers.extend(peers)
-                                        break
-                    
-                    version_info = self._parse_version_payload(msg[1])
+                    version_info = parse_version_payload(msg[1])
                     
                     writer.close()
                     await writer.wait_closed()
@@ -169,10 +171,12 @@ class BitcoinNodeCrawler:
                         'peers_discovered': len(new_peers)
                     }
                     
+                    seen = self._seen
                     for peer_ip, peer_port, _ in new_peers:
-                        if not is_private_ip(peer_ip):
-                            if (peer_ip, peer_port) not in self.discovered_nodes and (peer_ip, peer_port) not in self.crawled_nodes:
-                                self.discovered_nodes.add((peer_ip, peer_port))
+                        peer = (peer_ip, peer_port)
+                        if peer not in seen and not is_private_ip(peer_ip):
+                            seen.add(peer)
+                            self.discovered_nodes.add(peer)
                     
                     if new_peers:
                         logger.debug(f"Discovered {len(new_peers)} peers from {ip}:{port}")
@@ -197,58 +201,13 @@ class BitcoinNodeCrawler:
                 self.failed_nodes.add((ip, port))
                 return None
     
-    def _parse_version_payload(self, payload: bytes) -> dict:
-        try:
-            import struct
-            from bitcoin_protocol import varint_decode
-            
-            offset = 0
-            if len(payload) < 4:
-                return {}
-            
-            version = struct.unpack('<I', payload[offset:offset + 4])[0]
-            offset += 4
-            
-            if len(payload) < offset + 8:
-                return {'version': version}
-            
-            services = struct.unpack('<Q', payload[offset:offset + 8])[0]
-            offset += 8
-            
-            if len(payload) < offset + 8:
-                return {'version': version, 'services': services}
-            
-            timestamp = struct.unpack('<Q', payload[offset:offset + 8])[0]
-            offset += 8
-            
-            offset += 26
-            offset += 26
-            offset += 8
-            
-            user_agent = ''
-            if offset < len(payload):
-                try:
-                    ua_len, offset = varint_decode(payload, offset)
-                    if offset + ua_len <= len(payload):
-                        user_agent = payload[offset:offset + ua_len].decode('utf-8', errors='ignore')
-                except:
-                    pass
-            
-            return {
-                'version': version,
-                'services': services,
-                'timestamp': timestamp,
-                'user_agent': user_agent
-            }
-        except Exception:
-            return {}
-    
-    async def crawl(self, seed_nodes: List[Tuple[str, int]], max_nodes: int = 1000, update_viz_callback=None):
+    async def crawl(self, seed_nodes: List[Tuple[str, int]], max_nodes: int = 1000, update_viz_callback=None, node_queue: Optional[asyncio.Queue] = None):
         logger.info(f"Starting crawl with {len(seed_nodes)} seed nodes, max {max_nodes} nodes")
         
         for ip, port in seed_nodes:
             if not is_private_ip(ip):
                 self.discovered_nodes.add((ip, port))
+                self._seen.add((ip, port))
         
         tasks = []
         iteration = 0
@@ -264,14 +223,20 @@ class BitcoinNodeCrawler:
                 break
             
             batch_tasks = [self.connect_to_node(ip, port) for ip, port in to_crawl]
-            results = await asyncio.gather(*batch_tasks, return_exceptions=True)
             
             successful = 0
-            for result in results:
+            for next_result in asyncio.as_completed(batch_tasks):
+                try:
+                    result = await next_result
+                except Exception:
+                    continue
+                
                 if isinstance(result, dict) and result:
                     self.node_data.append(result)
                     successful += 1
                     logger.info(f"Crawled {result['ip']}:{result['port']} - Version: {result['version']}, Peers discovered: {result['peers_discovered']}")
+                    if node_queue is not None:
+                        await node_queue.put(result)
             
             logger.info(f"Batch complete: {successful}/{len(to_crawl)} successful, {len(self.discovered_nodes)} total discovered")
             
@@ -1,6 +1,6 @@
 import sqlite3
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
@@ -8,13 +8,34 @@ logger = logging.getLogger(__name__)
 
 
 class NodeDatabase:
+    _INSERT_SQL = '''
+        INSERT INTO nodes 
+        (ip, port, version, services, user_agent, timestamp, peers_discovered, latitude, longitude, country, city)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(ip, port) DO UPDATE SET
+            version = excluded.version,
+            services = excluded.services,
+            user_agent = excluded.user_agent,
+            timestamp = excluded.timestamp,
+            peers_discovered = excluded.peers_discovered,
+            latitude = COALESCE(excluded.latitude, latitude),
+            longitude = COALESCE(excluded.longitude, longitude),
+            country = COALESCE(excluded.country, country),
+            city = COALESCE(excluded.city, city)
+    '''
+    
     def __init__(self, db_path: str = "backend/bitcoin_nodes.db"):
         self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        self._conn.execute('PRAGMA mmap_size=268435456')
+        self._conn.execute('PRAGMA cache_size=-65536')
         self.init_database()
     
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS nodes (
@@ -35,114 +56,74 @@ class NodeDatabase:
             )
         ''')
         
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_ip_port ON nodes(ip, port)')
+        cursor.execute('DROP INDEX IF EXISTS idx_ip_port')
+        cursor.execute('DROP INDEX IF EXISTS idx_timestamp')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_country ON nodes(country)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON nodes(timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_latlon ON nodes(latitude, longitude) WHERE latitude IS NOT NULL')
         
-        conn.commit()
-        conn.close()
         logger.info(f"Database initialized at {self.db_path}")
     
+    @staticmethod
+    def _node_row(node_data: Dict) -> tuple:
+        return (
+            node_data.get('ip'),
+            node_data.get('port'),
+            node_data.get('version'),
+            node_data.get('services'),
+            node_data.get('user_agent'),
+            node_data.get('timestamp'),
+            node_data.get('peers_discovered'),
+            node_data.get('latitude'),
+            node_data.get('longitude'),
+            node_data.get('country'),
+            node_data.get('city')
+        )
+    
     def insert_node(self, node_data: Dict) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO nodes 
-                (ip, port, version, services, user_agent, timestamp, peers_discovered, latitude, longitude, country, city)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                node_data.get('ip'),
-                node_data.get('port'),
-                node_data.get('version'),
-                node_data.get('services'),
-                node_data.get('user_agent'),
-                node_data.get('timestamp'),
-                node_data.get('peers_discovered'),
-                node_data.get('latitude'),
-                node_data.get('longitude'),
-                node_data.get('country'),
-                node_data.get('city')
-            ))
-            conn.commit()
+            self._conn.execute(self._INSERT_SQL, self._node_row(node_data))
             return True
         except Exception as e:
             logger.error(f"Error inserting node: {e}")
-            conn.rollback()
             return False
-        finally:
-            conn.close()
     
     def insert_nodes_batch(self, nodes_data: List[Dict]):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
         
         try:
-            cursor.executemany('''
-                INSERT OR REPLACE INTO nodes 
-                (ip, port, version, services, user_agent, timestamp, peers_discovered, latitude, longitude, country, city)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', [(
-                node.get('ip'),
-                node.get('port'),
-                node.get('version'),
-                node.get('services'),
-                node.get('user_agent'),
-                node.get('timestamp'),
-                node.get('peers_discovered'),
-                node.get('latitude'),
-                node.get('longitude'),
-                node.get('country'),
-                node.get('city')
-            ) for node in nodes_data])
-            conn.commit()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.executemany(self._INSERT_SQL, [self._node_row(node) for node in nodes_data])
+            cursor.execute('COMMIT')
             logger.info(f"Inserted {len(nodes_data)} nodes into database")
         except Exception as e:
             logger.error(f"Error inserting nodes batch: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
+            if self._conn.in_transaction:
+                cursor.execute('ROLLBACK')
     
     def get_all_nodes(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self._conn.cursor()
+        cursor.row_factory = sqlite3.Row
         
         cursor.execute('SELECT * FROM nodes')
         rows = cursor.fetchall()
-        conn.close()
         
         return [dict(row) for row in rows]
     
+    def get_nodes_for_export(self) -> Tuple[List[str], List[tuple]]:
+        cursor = self._conn.execute(
+            'SELECT * FROM nodes WHERE latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180'
+        )
+        columns = [column[0] for column in cursor.description]
+        return columns, cursor.fetchall()
+    
     def get_nodes_with_location(self) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM nodes WHERE latitude IS NOT NULL AND longitude IS NOT NULL')
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        columns, rows = self.get_nodes_for_export()
+        return [dict(zip(columns, row)) for row in rows]
     
     def get_statistics(self) -> Dict:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM nodes')
-        total_nodes = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM nodes WHERE latitude IS NOT NULL')
-        nodes_with_location = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(DISTINCT country) FROM nodes WHERE country IS NOT NULL')
-        unique_countries = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT AVG(version) FROM nodes WHERE version IS NOT NULL')
-        avg_version = cursor.fetchone()[0]
-        
-        conn.close()
+        total_nodes, nodes_with_location, unique_countries, avg_version = self._conn.execute(
+            'SELECT COUNT(*), COUNT(latitude), COUNT(DISTINCT country), AVG(version) FROM nodes'
+        ).fetchone()
         
         return {
             'total_nodes': total_nodes,
@@ -150,4 +131,14 @@ class NodeDatabase:
             'unique_countries': unique_countries,
             'average_version': avg_version
         }
-
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,25 @@
+import asyncio
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+DNS_CACHE_TTL = 15 * 60
+_dns_cache: Dict[str, Tuple[List[str], float]] = {}
+
+
+def parse_node_address(address: str) -> Optional[Tuple[str, int]]:
+    ip, sep, port = address.rpartition(':')
+    return (ip, int(port)) if sep and ip and port.isdigit() else None
+
+
+async def resolve_seed(loop: asyncio.AbstractEventLoop, hostname: str, port: int, ttl: float = 0) -> List[str]:
+    if ttl:
+        cached = _dns_cache.get(hostname)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+    
+    addrinfo = await loop.getaddrinfo(hostname, port, family=socket.AF_INET, type=socket.SOCK_STREAM, flags=socket.AI_ADDRCONFIG)
+    ips = [info[4][0] for info in addrinfo]
+    if ttl:
+        _dns_cache[hostname] = (ips, time.monotonic() + ttl)
+    return ips
@@ -0,0 +1,67 @@
+import sqlite3
+import json
+import time
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+GEO_CACHE_TTL = 7 * 86400
+_SELECT_CHUNK = 500
+
+
+class GeoCache:
+    def __init__(self, db_path: str = "backend/bitcoin_nodes.db", ttl: int = GEO_CACHE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                ip TEXT PRIMARY KEY,
+                json TEXT NOT NULL,
+                fetched_at INTEGER NOT NULL
+            )
+        ''')
+    
+    def get_many(self, ips: List[str]) -> Dict[str, Dict]:
+        cutoff = int(time.time()) - self.ttl
+        results = {}
+        for i in range(0, len(ips), _SELECT_CHUNK):
+            chunk = ips[i:i + _SELECT_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(
+                f'SELECT ip, json FROM geo_cache WHERE fetched_at > ? AND ip IN ({placeholders})',
+                (cutoff, *chunk)
+            )
+            for ip, data in rows:
+                results[ip] = json.loads(data)
+        return results
+    
+    def put_many(self, locations: Dict[str, Dict]):
+        if not locations:
+            return
+        now = int(time.time())
+        try:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO geo_cache (ip, json, fetched_at) VALUES (?, ?, ?)',
+                [(ip, json.dumps(location), now) for ip, location in locations.items()]
+            )
+            self._conn.execute('COMMIT')
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute('ROLLBACK')
+            logger.error(f"Error caching {len(locations)} locations: {e}")
+    
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
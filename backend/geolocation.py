@@ -3,57 +3,97 @@ import aiohttp
 import logging
 from typing import Dict, Optional, List
 import time
+from yarl import URL
+
+from http_session import get_session, read_json
+from geo_cache import GeoCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+IPAPI_FIELDS = "status,message,country,countryCode,city,lat,lon,timezone,isp,query"
+IPAPI_BATCH_SIZE = 100
+IPAPI_BATCH_PER_MINUTE = 15
+
+_IPAPI_QUERY = f"fields={IPAPI_FIELDS}"
+_IPAPI_BATCH_URL = URL(f"http://ip-api.com/batch?{_IPAPI_QUERY}")
+
+_DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=5)
+_BATCH_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+def _parse_ipapi(data: Dict) -> Optional[Dict]:
+    if data.get('status') != 'success':
+        return None
+    return {
+        'latitude': data.get('lat'),
+        'longitude': data.get('lon'),
+        'country': data.get('country'),
+        'country_code': data.get('countryCode'),
+        'city': data.get('city'),
+        'timezone': data.get('timezone'),
+        'isp': data.get('isp')
+    }
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+                self.last_refill = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self.tokens) / self.refill_rate)
+    
+    def drain(self, pause: float = 0):
+        self.tokens = 0
+        self.last_refill = time.monotonic() + pause
+
 
 class IPGeolocator:
-    def __init__(self, rate_limit: float = 0.1):
+    def __init__(self, rate_limit: float = 0.1, burst: int = 10, cache: Optional[GeoCache] = None):
         self.rate_limit = rate_limit
-        self.last_request_time = 0
+        self.cache = cache
+        self.bucket = TokenBucket(capacity=burst, refill_rate=1 / max(rate_limit, 0.001))
+        self.batch_bucket = TokenBucket(capacity=1, refill_rate=IPAPI_BATCH_PER_MINUTE / 60)
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = await get_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
-    
-    async def _rate_limit(self):
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.rate_limit:
-            await asyncio.sleep(self.rate_limit - elapsed)
-        self.last_request_time = time.time()
+        self.session = None
     
     async def get_location(self, ip: str) -> Optional[Dict]:
-        if not self.session:
-            self.session = aiohttp.ClientSession()
+        if self.session is None or self.session.closed:
+            self.session = await get_session()
         
-        await self._rate_limit()
+        await self.bucket.acquire()
         
         try:
-            url = f"http://ip-api.com/json/{ip}?fields=status,message,country,countryCode,city,lat,lon,timezone,isp"
+            url = URL.build(scheme='http', host='ip-api.com', path='/json/' + ip, query_string=_IPAPI_QUERY, encoded=True)
             
-            async with self.session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+            async with self.session.get(url, timeout=_DEFAULT_TIMEOUT) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await read_json(response)
                     
-                    if data.get('status') == 'success':
-                        return {
-                            'latitude': data.get('lat'),
-                            'longitude': data.get('lon'),
-                            'country': data.get('country'),
-                            'country_code': data.get('countryCode'),
-                            'city': data.get('city'),
-                            'timezone': data.get('timezone'),
-                            'isp': data.get('isp')
-                        }
-                    else:
+                    location = _parse_ipapi(data)
+                    if location is None:
                         logger.debug(f"API returned error for {ip}: {data.get('message')}")
-                        return None
+                    return location
                 else:
                     logger.debug(f"HTTP {response.status} for {ip}")
                     return None
@@ -65,57 +105,103 @@ class IPGeolocator:
             logger.debug(f"Error getting location for {ip}: {e}")
             return None
     
-    async def get_locations_batch(self, ips: List[str], max_concurrent: int = 10) -> Dict[str, Optional[Dict]]:
-        semaphore = asyncio.Semaphore(max_concurrent)
+    async def _post_batch(self, ips: List[str]) -> Optional[Dict[str, Optional[Dict]]]:
+        if self.session is None or self.session.closed:
+            self.session = await get_session()
+        
+        await self.batch_bucket.acquire()
+        
+        try:
+            async with self.session.post(_IPAPI_BATCH_URL, json=ips, timeout=_BATCH_TIMEOUT) as response:
+                if response.status == 429:
+                    try:
+                        ttl = float(response.headers.get('X-Ttl', 60))
+                    except ValueError:
+                        ttl = 60
+                    logger.warning(f"ip-api batch rate limited, leaving {len(ips)} IPs unresolved for {ttl:g}s")
+                    self.batch_bucket.drain(ttl)
+                    return dict.fromkeys(ips)
+                if response.status != 200:
+                    logger.debug(f"HTTP {response.status} for batch of {len(ips)} IPs")
+                    return None
+                data = await read_json(response)
+            
+            if not isinstance(data, list):
+                logger.debug(f"Unexpected batch response for {len(ips)} IPs: {data!r:.200}")
+                return None
+            
+            results = dict.fromkeys(ips)
+            for entry in data:
+                ip = entry.get('query') if isinstance(entry, dict) else None
+                if ip in results:
+                    results[ip] = _parse_ipapi(entry)
+            return results
+        except Exception as e:
+            logger.debug(f"Error getting batch location for {len(ips)} IPs: {e}")
+            return None
+    
+    async def _get_locations_individually(self, ips: List[str]) -> Dict[str, Optional[Dict]]:
+        async def get_one(ip: str):
+            return ip, await self.get_location(ip)
+        
+        pairs = await asyncio.gather(*[get_one(ip) for ip in ips])
+        return dict(pairs)
+    
+    async def get_locations_batch(self, ips: List[str], chunk: int = IPAPI_BATCH_SIZE) -> Dict[str, Optional[Dict]]:
         results = {}
         
-        async def get_with_semaphore(ip: str):
-            async with semaphore:
-                location = await self.get_location(ip)
-                results[ip] = location
+        if self.cache:
+            results.update(await asyncio.to_thread(self.cache.get_many, ips))
+            ips = [ip for ip in ips if ip not in results]
+            if results:
+                logger.debug(f"Geolocation cache hits: {len(results)}, misses: {len(ips)}")
         
-        tasks = [get_with_semaphore(ip) for ip in ips]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        async def get_chunk(chunk_ips: List[str]):
+            locations = await self._post_batch(chunk_ips)
+            if locations is None:
+                locations = await self._get_locations_individually(chunk_ips)
+            return locations
         
+        tasks = [get_chunk(ips[i:i + chunk]) for i in range(0, len(ips), chunk)]
+        fetched = {}
+        for locations in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(locations, dict):
+                fetched.update(locations)
+        
+        if self.cache:
+            await asyncio.to_thread(self.cache.put_many, {ip: location for ip, location in fetched.items() if location})
+        
+        results.update(fetched)
         return results
 
 
 class IPInfoGeolocator:
-    def __init__(self, api_key: Optional[str] = None, rate_limit: float = 0.1):
+    def __init__(self, api_key: Optional[str] = None, rate_limit: float = 0.1, burst: int = 10):
         self.api_key = api_key
+        self._headers = {'Authorization': f'Bearer {api_key}'} if api_key else None
         self.rate_limit = rate_limit
-        self.last_request_time = 0
+        self.bucket = TokenBucket(capacity=burst, refill_rate=1 / max(rate_limit, 0.001))
         self.session: Optional[aiohttp.ClientSession] = None
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        self.session = await get_session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
-    
-    async def _rate_limit(self):
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.rate_limit:
-            await asyncio.sleep(self.rate_limit - elapsed)
-        self.last_request_time = time.time()
+        self.session = None
     
     async def get_location(self, ip: str) -> Optional[Dict]:
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            self.session = await get_session()
         
-        await self._rate_limit()
+        await self.bucket.acquire()
         
         try:
             url = f"https://ipinfo.io/{ip}/json"
-            headers = {}
-            if self.api_key:
-                headers['Authorization'] = f'Bearer {self.api_key}'
             
-            async with self.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=5)) as response:
+            async with self.session.get(url, headers=self._headers, timeout=_DEFAULT_TIMEOUT) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = await read_json(response)
                     
                     lat, lon = None, None
                     if 'loc' in data:
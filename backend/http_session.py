@@ -0,0 +1,60 @@
+import json
+import aiohttp
+from itertools import islice
+from typing import List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                limit_per_host=10,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def read_json(response: aiohttp.ClientResponse):
+    body = await response.read()
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+async def read_json_keys(response: aiohttp.ClientResponse, key: str, limit: int) -> List[str]:
+    if ijson is None:
+        data = await read_json(response)
+        return list(islice(data.get(key, {}), limit))
+    
+    keys = []
+    if limit <= 0:
+        return keys
+    async for prefix, event, value in ijson.parse_async(response.content):
+        if event == 'map_key' and prefix == key:
+            keys.append(value)
+            if len(keys) >= limit:
+                break
+    return keys
@@ -4,11 +4,14 @@ import asyncio
 import argparse
 import logging
 import sys
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 
-from crawler import BitcoinNodeCrawler
+from crawler import BitcoinNodeCrawler, install_event_loop_policy
 from database import NodeDatabase
+from dns_seeds import parse_node_address, resolve_seed
 from geolocation import IPGeolocator
+from geo_cache import GeoCache
+from http_session import get_session, close_session, read_json_keys
 from visualization import create_heatmap, create_statistics_plot
 
 logging.basicConfig(
@@ -30,55 +33,39 @@ BITCOIN_SEED_NODES = [
     ("seed.bitcoin.wiz.biz", 8333),
 ]
 
-
 async def fetch_bitnodes_seeds(max_nodes: int = 10000) -> List[Tuple[str, int]]:
     try:
         import aiohttp
-        async with aiohttp.ClientSession() as session:
-            try:
-                logger.info("Fetching nodes from bitnodes.io API...")
-                async with session.get('https://bitnodes.io/api/v1/snapshots/latest/', timeout=aiohttp.ClientTimeout(total=30)) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        nodes = []
-                        if 'nodes' in data:
-                            node_list = list(data['nodes'].keys())
-                            logger.info(f"Found {len(node_list)} total nodes in bitnodes.io")
-                            
-                            for node_info in node_list[:max_nodes]:
-                                try:
-                                    ip, port = node_info.split(':')
-                                    if ip and port:
-                                        nodes.append((ip, int(port)))
-                                except:
-                                    continue
-                        logger.info(f"Fetched {len(nodes)} nodes from bitnodes.io")
-                        return nodes
-            except Exception as e:
-                logger.warning(f"Error fetching from bitnodes.io: {e}")
+        session = await get_session()
+        try:
+            logger.info("Fetching nodes from bitnodes.io API...")
+            async with session.get('https://bitnodes.io/api/v1/snapshots/latest/', timeout=aiohttp.ClientTimeout(total=30)) as resp:
+                if resp.status == 200:
+                    node_list = await read_json_keys(resp, 'nodes', max_nodes)
+                    nodes = [node for node in map(parse_node_address, node_list) if node]
+                    logger.info(f"Fetched {len(nodes)} nodes from bitnodes.io")
+                    return nodes
+        except Exception as e:
+            logger.warning(f"Error fetching from bitnodes.io: {e}")
     except Exception as e:
         logger.debug(f"Could not fetch from bitnodes: {e}")
     return []
 
 
-def resolve_dns_seeds() -> List[Tuple[str, int]]:
-    import socket
+async def resolve_dns_seeds() -> List[Tuple[str, int]]:
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *[resolve_seed(loop, hostname, port) for hostname, port in BITCOIN_SEED_NODES],
+        return_exceptions=True
+    )
     
     resolved_nodes = []
-    for hostname, port in BITCOIN_SEED_NODES:
-        try:
-            try:
-                addrinfo = socket.getaddrinfo(hostname, port, socket.AF_INET)
-                for info in addrinfo:
-                    ip = info[4][0]
-                    resolved_nodes.append((ip, port))
-                    logger.info(f"Resolved {hostname} -> {ip}:{port}")
-            except:
-                ip = socket.gethostbyname(hostname)
-                resolved_nodes.append((ip, port))
-                logger.info(f"Resolved {hostname} -> {ip}:{port}")
-        except socket.gaierror as e:
-            logger.warning(f"Could not resolve {hostname}: {e}")
+    for (hostname, port), ips in zip(BITCOIN_SEED_NODES, results):
+        if isinstance(ips, Exception):
+            logger.warning(f"Could not resolve {hostname}: {ips}")
+            continue
+        resolved_nodes.extend((ip, port) for ip in ips)
+        logger.info(f"Resolved {hostname} -> {len(ips)} addresses")
     
     known_nodes = [
         ("104.248.9.1", 8333),
@@ -101,7 +88,7 @@ def resolve_dns_seeds() -> List[Tuple[str, int]]:
     resolved_nodes.extend(known_nodes)
     logger.info(f"Added {len(known_nodes)} known node IPs as seeds")
     
-    return resolved_nodes
+    return list(dict.fromkeys(resolved_nodes))
 
 
 async def main():
@@ -178,11 +165,18 @@ Examples:
     
     args = parser.parse_args()
     
+    try:
+        await run(args)
+    finally:
+        await close_session()
+
+
+async def run(args):
     db = NodeDatabase(args.db_path)
     
     if args.heatmap_only:
         logger.info("Heatmap-only mode: loading nodes from database")
-        nodes = db.get_nodes_with_location()
+        nodes = await asyncio.to_thread(db.get_nodes_with_location)
         
         if not nodes:
             logger.error("No nodes with location data found in database")
@@ -190,7 +184,7 @@ Examples:
             return
         
         logger.info(f"Found {len(nodes)} nodes with location data")
-        create_heatmap(nodes, f"{args.output_dir}/index.html", f"{args.output_dir}/bitcoin_nodes.json", load_once=True)
+        await asyncio.to_thread(create_heatmap, nodes, f"{args.output_dir}/index.html", f"{args.output_dir}/bitcoin_nodes.json", load_once=True)
         logger.info("Heatmap created successfully!")
         return
     
@@ -198,7 +192,7 @@ Examples:
     logger.info("Step 1: Crawling Bitcoin Network")
     logger.info("=" * 60)
     
-    seed_nodes = resolve_dns_seeds()
+    seed_nodes = await resolve_dns_seeds()
     
     try:
         bitnodes_seeds = await fetch_bitnodes_seeds(max_nodes=10000)
@@ -216,6 +210,7 @@ Examples:
             ("178.128.221.177", 8333),
         ]
     
+    seed_nodes = list(dict.fromkeys(seed_nodes))
     logger.info(f"Total seed nodes: {len(seed_nodes)}")
     
     crawler = BitcoinNodeCrawler(
@@ -236,19 +231,26 @@ Examples:
         logger.info("Step 2: Getting Geolocation Data")
         logger.info("=" * 60)
         
-        unique_ips = list(set(node['ip'] for node in nodes_data))
+        by_ip: Dict[str, List[Dict]] = {}
+        for node in nodes_data:
+            by_ip.setdefault(node['ip'], []).append(node)
+        unique_ips = list(by_ip)
         logger.info(f"Getting geolocation for {len(unique_ips)} unique IPs")
         
-        async with IPGeolocator(rate_limit=args.geolocation_rate_limit) as geolocator:
-            location_data = await geolocator.get_locations_batch(unique_ips, max_concurrent=10)
+        geo_cache = GeoCache(args.db_path)
+        try:
+            async with IPGeolocator(rate_limit=args.geolocation_rate_limit, cache=geo_cache) as geolocator:
+                location_data = await geolocator.get_locations_batch(unique_ips)
+        finally:
+            geo_cache.close()
         
-        for node in nodes_data:
-            ip = node['ip']
-            location = location_data.get(ip)
+        nodes_with_location = 0
+        for ip, location in location_data.items():
             if location:
-                node.update(location)
+                for node in by_ip[ip]:
+                    node.update(location)
+                nodes_with_location += len(by_ip[ip])
         
-        nodes_with_location = sum(1 for node in nodes_data if node.get('latitude'))
         logger.info(f"Got geolocation for {nodes_with_location} nodes")
     else:
         logger.info("Skipping geolocation step")
@@ -257,9 +259,9 @@ Examples:
     logger.info("Step 3: Storing Data in Database")
     logger.info("=" * 60)
     
-    db.insert_nodes_batch(nodes_data)
+    await asyncio.to_thread(db.insert_nodes_batch, nodes_data)
     
-    stats = db.get_statistics()
+    stats = await asyncio.to_thread(db.get_statistics)
     logger.info("Database Statistics:")
     logger.info(f"  Total nodes: {stats['total_nodes']}")
     logger.info(f"  Nodes with location: {stats['nodes_with_location']}")
@@ -271,12 +273,12 @@ Examples:
         logger.info("Step 4: Updating JSON File")
         logger.info("=" * 60)
         
-        all_nodes = db.get_nodes_with_location()
+        all_nodes = await asyncio.to_thread(db.get_nodes_with_location)
         
         if all_nodes:
             from visualization import export_nodes_json
             json_file = f"{args.output_dir}/bitcoin_nodes.json"
-            export_nodes_json(all_nodes, json_file)
+            await asyncio.to_thread(export_nodes_json, all_nodes, json_file)
             logger.info(f"Updated {json_file} with {len(all_nodes)} nodes (all nodes from database)")
             logger.info("Note: index.html was not modified - it reads from bitcoin_nodes.json")
         else:
@@ -288,6 +290,7 @@ Examples:
 
 
 if __name__ == "__main__":
+    install_event_loop_policy()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
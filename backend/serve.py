@@ -6,9 +6,7 @@ import os
 import sys
 import webbrowser
 import threading
-import queue
 import time
-import socket
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
@@ -18,30 +16,52 @@ FRONTEND_DIR = PROJECT_ROOT / "frontend"
 JSON_FILE = FRONTEND_DIR / "bitcoin_nodes.json"
 DEFAULT_PORT = 8000
 
+sse_clients = []
+sse_clients_lock = threading.Lock()
+SSE_KEEPALIVE_INTERVAL = 30
+FILE_CHANGE_DEBOUNCE = 0.25
 
-def find_available_port(start_port=8000, max_attempts=10):
-    for port in range(start_port, start_port + max_attempts):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(('', port))
-                return port
-        except OSError:
-            continue
-    return None
 
-file_change_queue = queue.Queue()
-sse_clients = []
+def notify_sse_clients(timestamp):
+    with sse_clients_lock:
+        for event, timestamps in sse_clients:
+            timestamps.append(timestamp)
+            event.set()
 
 
 class JSONFileHandler(FileSystemEventHandler):
     
+    def __init__(self, debounce=FILE_CHANGE_DEBOUNCE):
+        super().__init__()
+        self.debounce = debounce
+        self._pending_timer = None
+        self._timer_lock = threading.Lock()
+    
     def on_modified(self, event):
         if not event.is_directory and event.src_path == str(JSON_FILE):
-            file_change_queue.put(('file_changed', time.time()))
-            print(f"✓ Detected change in {JSON_FILE.name}")
+            self._schedule_emit()
+    
+    def on_moved(self, event):
+        if not event.is_directory and event.dest_path == str(JSON_FILE):
+            self._schedule_emit()
+    
+    def _schedule_emit(self):
+        with self._timer_lock:
+            if self._pending_timer is not None:
+                self._pending_timer.cancel()
+            self._pending_timer = threading.Timer(self.debounce, self._emit)
+            self._pending_timer.daemon = True
+            self._pending_timer.start()
+    
+    def _emit(self):
+        with self._timer_lock:
+            self._pending_timer = None
+        notify_sse_clients(time.time())
+        print(f"✓ Detected change in {JSON_FILE.name}")
 
 
 class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
+    _etag = None
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=str(FRONTEND_DIR), **kwargs)
@@ -50,11 +70,64 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        self.send_header('Cache-Control', 'no-cache')
+        if self._etag:
+            self.send_header('ETag', self._etag)
         super().end_headers()
     
+    def _read_etag(self, path):
+        try:
+            with open(path + '.etag') as f:
+                if os.fstat(f.fileno()).st_mtime < os.stat(path).st_mtime:
+                    return None
+                return f'W/"{f.read().strip()}"'
+        except OSError:
+            return None
+    
+    def _etag_matches(self):
+        if_none_match = self.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or any(tag.removeprefix('W/') == self._etag.removeprefix('W/') for tag in tags)
+    
+    def send_head(self):
+        path = self.translate_path(self.path)
+        self._etag = self._read_etag(path) if os.path.isfile(path) else None
+        if self._etag and self._etag_matches():
+            self.send_response(304)
+            self.end_headers()
+            return None
+        
+        if 'gzip' not in self.headers.get('Accept-Encoding', '') or not os.path.isfile(path):
+            return super().send_head()
+        
+        try:
+            f = open(path + '.gz', 'rb')
+        except OSError:
+            return super().send_head()
+        
+        fs = os.fstat(f.fileno())
+        if fs.st_mtime < os.stat(path).st_mtime:
+            f.close()
+            return super().send_head()
+        
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(fs.st_size))
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Last-Modified', self.date_time_string(fs.st_mtime))
+        self.end_headers()
+        return f
+    
+    def copyfile(self, source, outputfile):
+        if outputfile is self.wfile and hasattr(source, 'fileno'):
+            outputfile.flush()
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
+    
     def do_OPTIONS(self):
         self.send_response(200)
         self.end_headers()
@@ -68,31 +141,34 @@ class CORSRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
             
-            client_id = id(self)
-            sse_clients.append(client_id)
+            event = threading.Event()
+            client = (event, [])
+            with sse_clients_lock:
+                sse_clients.append(client)
             
             try:
                 self.wfile.write(b'data: {"type": "connected"}\n\n')
                 self.wfile.flush()
                 
-                last_check = time.time()
                 while True:
                     try:
-                        try:
-                            event_type, timestamp = file_change_queue.get(timeout=1)
-                            if event_type == 'file_changed':
-                                self.wfile.write(f'data: {{"type": "file_changed", "timestamp": {timestamp}}}\n\n'.encode())
-                                self.wfile.flush()
-                        except queue.Empty:
-                            if time.time() - last_check > 30:
-                                self.wfile.write(b': keepalive\n\n')
+                        if event.wait(timeout=SSE_KEEPALIVE_INTERVAL):
+                            event.clear()
+                            with sse_clients_lock:
+                                timestamps = client[1][:]
+                                client[1].clear()
+                            if timestamps:
+                                self.wfile.write(f'data: {{"type": "file_changed", "timestamp": {timestamps[-1]}}}\n\n'.encode())
                                 self.wfile.flush()
-                                last_check = time.time()
+                        else:
+                            self.wfile.write(b': keepalive\n\n')
+                            self.wfile.flush()
                     except (BrokenPipeError, ConnectionResetError, OSError):
                         break
             finally:
-                if client_id in sse_clients:
-                    sse_clients.remove(client_id)
+                with sse_clients_lock:
+                    if client in sse_clients:
+                        sse_clients.remove(client)
         else:
             super().do_GET()
 
@@ -106,23 +182,32 @@ def start_file_watcher():
     return observer
 
 
+def create_server(port=DEFAULT_PORT):
+    try:
+        return socketserver.TCPServer(("", port), CORSRequestHandler)
+    except OSError:
+        return socketserver.TCPServer(("", 0), CORSRequestHandler)
+
+
 def main():
     os.chdir(FRONTEND_DIR)
     
     observer = start_file_watcher()
     
-    port = find_available_port(DEFAULT_PORT)
-    if port is None:
-        print(f"Error: Could not find an available port starting from {DEFAULT_PORT}")
+    try:
+        httpd = create_server(DEFAULT_PORT)
+    except OSError as e:
+        print(f"Error starting server: {e}")
         observer.stop()
         observer.join()
         sys.exit(1)
     
+    port = httpd.server_address[1]
     if port != DEFAULT_PORT:
         print(f"⚠ Port {DEFAULT_PORT} is in use, using port {port} instead")
     
     try:
-        with socketserver.TCPServer(("", port), CORSRequestHandler) as httpd:
+        with httpd:
             url = f"http://localhost:{port}/index.html"
             print("=" * 60)
             print("Bitcoin Node Map Server")
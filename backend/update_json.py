@@ -2,6 +2,7 @@
 
 import sys
 import os
+from typing import Optional
 
 backend_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, backend_dir)
@@ -14,17 +15,24 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def update_json_from_db(db_path: str = "backend/bitcoin_nodes.db", json_file: str = "frontend/bitcoin_nodes.json"):
-    db = NodeDatabase(db_path)
-    nodes = db.get_nodes_with_location()
+def update_json_from_db(db_path: str = "backend/bitcoin_nodes.db", json_file: str = "frontend/bitcoin_nodes.json", db: Optional[NodeDatabase] = None):
+    owns_db = db is None
+    if owns_db:
+        db = NodeDatabase(db_path)
     
-    if nodes:
-        export_nodes_json(nodes, json_file)
-        logger.info(f"Updated {json_file} with {len(nodes)} nodes")
-        return len(nodes)
-    else:
-        logger.warning("No nodes found in database")
-        return 0
+    try:
+        nodes = db.get_nodes_with_location()
+        
+        if nodes:
+            export_nodes_json(nodes, json_file)
+            logger.info(f"Updated {json_file} with {len(nodes)} nodes")
+            return len(nodes)
+        else:
+            logger.warning("No nodes found in database")
+            return 0
+    finally:
+        if owns_db:
+            db.close()
 
 
 if __name__ == "__main__":
@@ -2,27 +2,39 @@
 
 import time
 import logging
+import sqlite3
+from database import NodeDatabase
 from update_json import update_json_from_db
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def main():
-    logger.info("Starting JSON update loop (every 10 seconds)")
+def main(db_path: str = "backend/bitcoin_nodes.db", interval: float = 10):
+    logger.info(f"Starting JSON update loop (checking for changes every {interval:g} seconds)")
     logger.info("Press Ctrl+C to stop")
     
+    db = NodeDatabase(db_path)
+    conn = sqlite3.connect(db_path)
+    last_version = None
+    
     try:
         while True:
             try:
-                update_json_from_db()
-                logger.info("✓ JSON updated")
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if version != last_version:
+                    update_json_from_db(db_path, db=db)
+                    last_version = version
+                    logger.info("✓ JSON updated")
             except Exception as e:
                 logger.error(f"Error updating JSON: {e}")
             
-            time.sleep(10)
+            time.sleep(interval)
     except KeyboardInterrupt:
         logger.info("\nUpdate loop stopped")
+    finally:
+        conn.close()
+        db.close()
 
 
 if __name__ == "__main__":
@@ -1,303 +1,204 @@
 #!/usr/bin/env python3
 
+import gzip
+import hashlib
+import html
 import json
 import logging
+import os
+import struct
+import tempfile
 import time
-from typing import Dict, List
+from collections import Counter
+from typing import Dict, List, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+HEAT_BIN_DEGREES = 0.5
+COORD_SCALE = 100
+_RENDER_KEYS = ('latitude', 'longitude', 'country', 'city', 'ip', 'port', 'version', 'user_agent')
+_POPUP_RENDER_KEYS = ('latitude', 'longitude')
+_template = None
+_last_page = None
+
+
+def _get_template():
+    global _template
+    if _template is None:
+        from jinja2 import Environment, FileSystemLoader
+        env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            auto_reload=False,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            keep_trailing_newline=True
+        )
+        _template = env.get_template('map.html.j2')
+    return _template
+
+
+def _dumps(obj, pretty: bool = False) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _atomic_write(path: str, payload: bytes):
+    f = tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            f.write(payload)
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, path)
+    except BaseException:
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
+        raise
+
+
+def _mtime_ns(path: str):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _write_static(path: str, payload: bytes) -> bool:
+    etag = hashlib.blake2b(payload, digest_size=12).hexdigest().encode('ascii')
+    try:
+        with open(path + '.etag', 'rb') as f:
+            if os.fstat(f.fileno()).st_mtime_ns >= os.stat(path).st_mtime_ns and f.read() == etag:
+                return False
+    except OSError:
+        pass
+    _atomic_write(path, payload)
+    _atomic_write(path + '.gz', gzip.compress(payload, compresslevel=6, mtime=0))
+    _atomic_write(path + '.etag', etag)
+    return True
+
+
+def heat_file_for(json_file: str) -> str:
+    return os.path.splitext(json_file)[0] + '.heat.bin'
+
 
-def export_nodes_json(nodes_data: List[Dict], json_file: str = "frontend/bitcoin_nodes.json") -> str:
-    with open(json_file, 'w') as f:
-        json.dump(nodes_data, f, indent=2)
-    logger.info(f"Exported {len(nodes_data)} nodes to {json_file}")
+def stats_file_for(json_file: str) -> str:
+    return os.path.splitext(json_file)[0] + '.stats.json'
+
+
+def _pack_heat_bins(bins: Counter) -> bytes:
+    buf = bytearray()
+    for (lat, lon), count in bins.items():
+        buf += struct.pack('<hhh', round(lat * COORD_SCALE), round(lon * COORD_SCALE), min(count, 32767))
+    return bytes(buf)
+
+
+def _popup_html(node: Dict) -> str:
+    def field(key):
+        return html.escape(str(node.get(key) or 'N/A'))
+    user_agent = html.escape((node.get('user_agent') or 'N/A')[:60])
+    return (
+        '<div class="node-popup">'
+        '<b>📍 Node Information</b><hr>'
+        f'<b>IP:</b> {field("ip")}<br>'
+        f'<b>Port:</b> {field("port")}<br>'
+        f'<b>Version:</b> {field("version")}<br>'
+        f'<b>Country:</b> {field("country")}<br>'
+        f'<b>City:</b> {field("city")}<br>'
+        '<b>User Agent:</b><br>'
+        f'<small>{user_agent}...</small>'
+        '</div>'
+    )
+
+
+def _collect_export(nodes_data: List[Dict], render_only: bool = True, popups: bool = True) -> Tuple[List[Dict], Counter, Dict]:
+    keys = _POPUP_RENDER_KEYS if popups else _RENDER_KEYS
+    records = []
+    bins = Counter()
+    sum_lat = sum_lon = 0.0
+    countries = set()
+    for node in nodes_data:
+        lat = node.get('latitude')
+        lon = node.get('longitude')
+        if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            continue
+        record = {k: node.get(k) for k in keys} if render_only else dict(node)
+        if popups:
+            record['popup'] = _popup_html(node)
+        records.append(record)
+        bins[(round(lat / HEAT_BIN_DEGREES) * HEAT_BIN_DEGREES, round(lon / HEAT_BIN_DEGREES) * HEAT_BIN_DEGREES)] += 1
+        sum_lat += lat
+        sum_lon += lon
+        country = node.get('country')
+        if country:
+            countries.add(country)
+    count = len(records)
+    stats = {
+        'count': count,
+        'countries': len(countries),
+        'avg_lat': sum_lat / count if count else 0.0,
+        'avg_lon': sum_lon / count if count else 0.0
+    }
+    return records, bins, stats
+
+
+def _write_export(json_file: str, records: List[Dict], bins: Counter, stats: Dict, pretty: bool = False):
+    _write_static(json_file, _dumps(records, pretty))
+    _write_static(heat_file_for(json_file), _pack_heat_bins(bins))
+    _write_static(stats_file_for(json_file), _dumps(stats))
+    logger.info("Exported %d nodes to %s", len(records), json_file)
+
+
+def export_nodes_json(nodes_data: List[Dict], json_file: str = "frontend/bitcoin_nodes.json", pretty: bool = False, render_only: bool = True, popups: bool = True) -> str:
+    _write_export(json_file, *_collect_export(nodes_data, render_only, popups), pretty=pretty)
     return json_file
 
 
 def create_heatmap(nodes_data: List[Dict], output_file: str = "frontend/index.html", json_file: str = "frontend/bitcoin_nodes.json", load_once: bool = False) -> str:
-    valid_nodes = [
-        node for node in nodes_data
-        if node.get('latitude') is not None 
-        and node.get('longitude') is not None
-        and -90 <= node['latitude'] <= 90
-        and -180 <= node['longitude'] <= 180
-    ]
+    records, bins, stats = _collect_export(nodes_data)
     
-    if not valid_nodes:
+    if not records:
         logger.warning("No nodes with valid coordinates found")
         return None
     
-    logger.info(f"Creating heatmap with {len(valid_nodes)} nodes")
-    
-    avg_lat = sum(node['latitude'] for node in valid_nodes) / len(valid_nodes)
-    avg_lon = sum(node['longitude'] for node in valid_nodes) / len(valid_nodes)
-    
-    export_nodes_json(valid_nodes, json_file)
+    logger.info("Creating heatmap with %d nodes", len(records))
     
-    unique_countries = len(set(node.get('country', '') for node in valid_nodes if node.get('country')))
+    _write_export(json_file, records, bins, stats)
     
     update_text = "Data loaded" if load_once else "Nodes will be updated every 10 seconds"
     
-    if load_once:
-        update_js_code = ""
-    else:
-        update_js_code = """
-        function tryUpdateFromFile() {
-            const loader = document.getElementById('update-loader');
-            const updateText = document.getElementById('update-text');
-            if (loader) loader.classList.remove('hidden');
-            if (updateText) updateText.textContent = 'Updating nodes...';
-            
-            fetch('bitcoin_nodes.json?t=' + new Date().getTime())
-                .then(response => {
-                    if (!response.ok) throw new Error('Network response was not ok');
-                    return response.json();
-                })
-                        .then(data => {
-                    console.log('✓ Updated from server:', data.length, 'nodes');
-                    loadNodes(data);
-                        })
-                        .catch(error => {
-                    console.log('Using embedded data (server fetch failed):', error.message);
-                    if (loader) loader.classList.add('hidden');
-                    if (updateText) updateText.textContent = 'Nodes will be updated every 10 seconds';
-                        });
-                }
-                
-        setInterval(tryUpdateFromFile, 10000);
-        
-        setTimeout(tryUpdateFromFile, 2000);"""
-    
-    html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Bitcoin Network Map</title>
-    
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.3/dist/leaflet.css" />
-    
-    <style>
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        html, body {{
-            width: 100%;
-            height: 100%;
-            overflow: hidden;
-        }}
-        
-        #map {{
-            width: 100%;
-            height: 100vh;
-            position: fixed;
-            top: 0;
-            left: 0;
-            z-index: 1;
-        }}
-        
-        .stats-panel {{
-            position: fixed;
-            top: 20px;
-            right: 20px;
-            width: 280px;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    z-index: 9999; 
-                    border-radius: 12px; 
-                    padding: 20px;
-                    color: white;
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.3);
-        }}
-        
-        .stats-panel h3 {{
-            margin: 0 0 15px 0;
-            font-size: 18px;
-            font-weight: 600;
-            text-align: center;
-            border-bottom: 2px solid rgba(255,255,255,0.3);
-            padding-bottom: 10px;
-        }}
-        
-        .stats-content {{
-            background: rgba(255,255,255,0.15);
-            border-radius: 8px;
-            padding: 12px;
-            margin-bottom: 10px;
-        }}
-        
-        .stats-content p {{
-            margin: 5px 0;
-            font-size: 14px;
-        }}
-        
-        .stats-content span {{
-            float: right;
-            font-weight: 700;
-        }}
-        
-        .loading {{
-            margin: 10px 0 0 0;
-            font-size: 11px;
-            text-align: center;
-            opacity: 0.8;
-            font-style: italic;
-            min-height: 20px;
-        }}
-        
-        .loader {{
-            display: inline-block;
-            width: 12px;
-            height: 12px;
-            border: 2px solid rgba(255, 255, 255, 0.3);
-            border-radius: 50%;
-            border-top-color: white;
-            animation: spin 0.8s linear infinite;
-            margin-right: 6px;
-            vertical-align: middle;
-        }}
-        
-        @keyframes spin {{
-            to {{ transform: rotate(360deg); }}
-        }}
-        
-        .loader.hidden {{
-            display: none;
-        }}
-    </style>
-    </head>
-<body>
-    <div class="stats-panel">
-        <h3>🌍 Bitcoin Network Mainnet</h3>
-        <div class="stats-content">
-            <p><b>Total Nodes:</b> <span id="node-count">{len(valid_nodes)}</span></p>
-            <p><b>Countries:</b> <span id="country-count">{unique_countries}</span></p>
-        </div>
-        <p class="loading">
-            <span class="loader hidden" id="update-loader"></span>
-            <span id="update-text">{update_text}</span>
-        </p>
-    </div>
+    output_dir = os.path.dirname(output_file) or '.'
     
-    <div id="map"></div>
+    def url_for(path):
+        return os.path.relpath(path, output_dir).replace(os.sep, '/')
     
-    <script src="https://unpkg.com/leaflet@1.9.3/dist/leaflet.js"></script>
-    <script src="https://unpkg.com/leaflet.heat@0.2.0/dist/leaflet-heat.js"></script>
+    context = dict(
+        update_text=update_text,
+        json_url=url_for(json_file),
+        heat_url=url_for(heat_file_for(json_file)),
+        stats_url=url_for(stats_file_for(json_file)),
+        load_once=load_once
+    )
     
-    <script>
-        const map = L.map('map', {{
-            center: [{avg_lat}, {avg_lon}],
-            zoom: 2,
-            maxBounds: [[-90, -180], [90, 180]],
-            worldCopyJump: false
-        }});
-        
-        L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
-            attribution: '© <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors',
-            maxZoom: 19
-        }}).addTo(map);
-        
-        let heatmapLayer = null;
-        let markersLayer = L.layerGroup().addTo(map);
-        
-        const nodeData = {json.dumps(valid_nodes, ensure_ascii=False)};
-        
-        function loadNodes(dataToUse = null) {{
-            const data = dataToUse || nodeData;
-            
-            try {{
-                    console.log('Loaded', data.length, 'nodes');
-                                
-                    document.getElementById('node-count').textContent = data.length;
-                                    const countries = new Set(data.filter(n => n.country).map(n => n.country));
-                    document.getElementById('country-count').textContent = countries.size;
-                                
-                                const heatData = data.map(node => [node.latitude, node.longitude, 1]);
-                                
-                    if (heatmapLayer) {{
-                        map.removeLayer(heatmapLayer);
-                    }}
-                    
-                                if (typeof L.heatLayer !== 'undefined') {{
-                                    heatmapLayer = L.heatLayer(heatData, {{
-                                        radius: 20,
-                                        blur: 20,
-                                        maxZoom: 18,
-                                        gradient: {{
-                                            0.2: 'blue',
-                                            0.4: 'cyan', 
-                                            0.6: 'lime',
-                                            0.8: 'yellow',
-                                            1.0: 'red'
-                                        }},
-                                        minOpacity: 0.3
-                        }}).addTo(map);
-                                }}
-                                
-                                    markersLayer.clearLayers();
-                                    
-                                    const nodesToShow = data.length <= 1000 ? data : data.slice(0, 1000);
-                                    nodesToShow.forEach(node => {{
-                                        const popupText = `
-                                            <div style="font-family: monospace; font-size: 12px;">
-                                                <b>📍 Node Information</b><hr style="margin: 5px 0;">
-                                                <b>IP:</b> ${{node.ip || 'N/A'}}<br>
-                                                <b>Port:</b> ${{node.port || 'N/A'}}<br>
-                                                <b>Version:</b> ${{node.version || 'N/A'}}<br>
-                                                <b>Country:</b> ${{node.country || 'N/A'}}<br>
-                                                <b>City:</b> ${{node.city || 'N/A'}}<br>
-                                                <b>User Agent:</b><br>
-                                                <small>${{(node.user_agent || 'N/A').substring(0, 60)}}...</small>
-                                            </div>
-                                        `;
-                                        
-                                        L.circleMarker([node.latitude, node.longitude], {{
-                                            radius: 4,
-                                            color: '#ff4444',
-                                            fillColor: '#ff6666',
-                                            fill: true,
-                                            fillOpacity: 0.6,
-                                            weight: 1
-                                        }}).bindPopup(popupText).addTo(markersLayer);
-                                    }});
-                                    
-                                    if (data.length > 1000) {{
-                                        console.log('Showing first 1000 markers for performance');
-                                    }}
-                    
-                    const loader = document.getElementById('update-loader');
-                    const updateText = document.getElementById('update-text');
-                    if (loader) loader.classList.add('hidden');
-                    if (updateText) updateText.textContent = '{update_text}';
-            }} catch(error) {{
-                console.error('Error processing nodes:', error);
-                const loader = document.getElementById('update-loader');
-                const updateText = document.getElementById('update-text');
-                if (loader) loader.classList.add('hidden');
-                if (updateText) updateText.textContent = 'Error processing data';
-            }}
-        }}
-        
-        loadNodes();
-        
-        {update_js_code}
-        
-        setTimeout(function() {{
-            map.invalidateSize();
-        }}, 100);
-    </script>
-</body>
-</html>
-    """
+    global _last_page
+    if _last_page == (output_file, context, _mtime_ns(output_file)):
+        logger.info("Heatmap unchanged, keeping %s", output_file)
+        return output_file
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    html_content = _get_template().render(**context)
+    _write_static(output_file, html_content.encode('utf-8'))
+    _last_page = (output_file, context, _mtime_ns(output_file))
     
-    logger.info(f"Heatmap saved to {output_file}")
+    logger.info("Heatmap saved to %s", output_file)
     return output_file
 
 
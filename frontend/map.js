@@ -10,7 +10,73 @@
     }).addTo(map);
     let heatmapLayer = null;
     let markersLayer = L.layerGroup().addTo(map);
-    function loadNodes(dataToUse) {
+    const markerRenderer = L.canvas({ padding: 0.5 });
+    const MAX_MARKERS = 1000;
+    const MARKER_BATCH_SIZE = 100;
+    let markerPass = 0;
+    const scheduleIdle = window.requestIdleCallback ? cb => window.requestIdleCallback(cb) : cb => setTimeout(cb, 1);
+    let nodeItems = [];
+    let nodeTree = null;
+    function escapeHtml(value) {
+        return String(value).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;' })[c]);
+    }
+    function buildPopup(node) {
+        return `
+            <div class="node-popup">
+                <b>📍 Node Information</b><hr>
+                <b>IP:</b> ${escapeHtml(node.ip || 'N/A')}<br>
+                <b>Port:</b> ${escapeHtml(node.port || 'N/A')}<br>
+                <b>Version:</b> ${escapeHtml(node.version || 'N/A')}<br>
+                <b>Country:</b> ${escapeHtml(node.country || 'N/A')}<br>
+                <b>City:</b> ${escapeHtml(node.city || 'N/A')}<br>
+                <b>User Agent:</b><br>
+                <small>${escapeHtml((node.user_agent || 'N/A').substring(0, 60))}...</small>
+            </div>
+        `;
+    }
+    function decodeHeat(buf) {
+        const v = new Int16Array(buf);
+        const points = [];
+        for (let i = 0; i + 2 < v.length; i += 3) {
+            points.push([v[i] / 100, v[i + 1] / 100, v[i + 2]]);
+        }
+        return points;
+    }
+    function updateVisibleMarkers() {
+        const bounds = map.getBounds();
+        const visible = nodeTree ? nodeTree.search({
+            minX: bounds.getWest(),
+            minY: bounds.getSouth(),
+            maxX: bounds.getEast(),
+            maxY: bounds.getNorth()
+        }) : nodeItems;
+        markersLayer.clearLayers();
+        const nodesToShow = visible.slice(0, MAX_MARKERS);
+        const pass = ++markerPass;
+        function addBatch(start) {
+            if (pass !== markerPass) return;
+            const end = Math.min(start + MARKER_BATCH_SIZE, nodesToShow.length);
+            for (let i = start; i < end; i++) {
+                const node = nodesToShow[i].node;
+                L.circleMarker([node.latitude, node.longitude], {
+                    radius: 4,
+                    color: '#ff4444',
+                    fillColor: '#ff6666',
+                    fill: true,
+                    fillOpacity: 0.6,
+                    weight: 1,
+                    renderer: markerRenderer
+                }).bindPopup(node.popup || buildPopup(node)).addTo(markersLayer);
+            }
+            if (end < nodesToShow.length) scheduleIdle(() => addBatch(end));
+        }
+        addBatch(0);
+        if (visible.length > MAX_MARKERS) {
+            console.log('Showing', MAX_MARKERS, 'of', visible.length, 'markers in view');
+        }
+    }
+    map.on('moveend', updateVisibleMarkers);
+    function loadNodes(dataToUse, heatPoints = null) {
         if (!dataToUse || !Array.isArray(dataToUse)) {
             console.error('Invalid or missing data provided to loadNodes');
             return;
@@ -18,16 +84,7 @@
         const data = dataToUse;
         try {
                 console.log('Loaded', data.length, 'nodes');
-                const nodeCountEl = document.getElementById('node-count');
-                if (nodeCountEl) {
-                    nodeCountEl.textContent = data.length;
-                }
-                const countries = new Set(data.filter(n => n.country && n.country.trim()).map(n => n.country));
-                const countryCountEl = document.getElementById('country-count');
-                if (countryCountEl) {
-                    countryCountEl.textContent = countries.size;
-                }
-                            const heatData = data.map(node => [node.latitude, node.longitude, 1]);
+                            const heatData = heatPoints || data.map(node => [node.latitude, node.longitude, 1]);
                 if (heatmapLayer) {
                     map.removeLayer(heatmapLayer);
                 }
@@ -46,33 +103,15 @@
                                     minOpacity: 0.3
                     }).addTo(map);
                             }
-                                markersLayer.clearLayers();
-                                const nodesToShow = data.length <= 1000 ? data : data.slice(0, 1000);
-                                nodesToShow.forEach(node => {
-                                    const popupText = `
-                                        <div style="font-family: monospace; font-size: 12px;">
-                                            <b>📍 Node Information</b><hr style="margin: 5px 0;">
-                                            <b>IP:</b> ${node.ip || 'N/A'}<br>
-                                            <b>Port:</b> ${node.port || 'N/A'}<br>
-                                            <b>Version:</b> ${node.version || 'N/A'}<br>
-                                            <b>Country:</b> ${node.country || 'N/A'}<br>
-                                            <b>City:</b> ${node.city || 'N/A'}<br>
-                                            <b>User Agent:</b><br>
-                                            <small>${(node.user_agent || 'N/A').substring(0, 60)}...</small>
-                                        </div>
-                                    `;
-                                    L.circleMarker([node.latitude, node.longitude], {
-                                        radius: 4,
-                                        color: '#ff4444',
-                                        fillColor: '#ff6666',
-                                        fill: true,
-                                        fillOpacity: 0.6,
-                                        weight: 1
-                                    }).bindPopup(popupText).addTo(markersLayer);
-                                });
-                                if (data.length > 1000) {
-                                    console.log('Showing first 1000 markers for performance');
-                                }
+                nodeItems = data.map(node => ({
+                    minX: node.longitude,
+                    minY: node.latitude,
+                    maxX: node.longitude,
+                    maxY: node.latitude,
+                    node: node
+                }));
+                nodeTree = typeof RBush !== 'undefined' ? new RBush().load(nodeItems) : null;
+                updateVisibleMarkers();
                 const loader = document.getElementById('update-loader');
                 const updateText = document.getElementById('update-text');
                 if (loader) loader.classList.add('hidden');
@@ -85,14 +124,29 @@
             if (updateText) updateText.textContent = 'Error loading data';
         }
     }
-    fetch('bitcoin_nodes.json')
+    function applyStats(stats) {
+        const nodeCountEl = document.getElementById('node-count');
+        if (nodeCountEl) nodeCountEl.textContent = stats.count;
+        const countryCountEl = document.getElementById('country-count');
+        if (countryCountEl) countryCountEl.textContent = stats.countries;
+        if (stats.count) map.setView([stats.avg_lat, stats.avg_lon], map.getZoom());
+    }
+    fetch('bitcoin_nodes.stats.json', { cache: 'no-cache' })
+        .then(response => response.ok ? response.json() : null)
+        .then(stats => { if (stats) applyStats(stats); })
+        .catch(() => {});
+    const nodesRequest = fetch('bitcoin_nodes.json', { cache: 'no-cache' })
         .then(response => {
             if (!response.ok) throw new Error('Network response was not ok');
             return response.json();
-        })
-        .then(data => {
+        });
+    const heatRequest = fetch('bitcoin_nodes.heat.bin', { cache: 'no-cache' })
+        .then(response => response.ok ? response.arrayBuffer().then(decodeHeat) : null)
+        .catch(() => null);
+    Promise.all([nodesRequest, heatRequest])
+        .then(([data, heatPoints]) => {
             console.log('✓ Loaded', data.length, 'nodes from file');
-            loadNodes(data);
+            loadNodes(data, heatPoints);
         })
         .catch(error => {
             console.error('Error loading data:', error.message);
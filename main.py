@@ -7,8 +7,10 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
 if __name__ == "__main__":
     from backend.main import main
+    from crawler import install_event_loop_policy
     import asyncio
     
+    install_event_loop_policy()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,82 @@
+import os
+import socket
+import struct
+import sys
+import unittest
+
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, backend_dir)
+
+from bitcoin_protocol import (
+    HEADER_SIZE,
+    MSG_ADDR,
+    create_message,
+    parse_addr_message,
+    parse_message,
+    varint_encode
+)
+
+
+def _addr_entry(timestamp, ip, port, services=1):
+    if ':' in ip:
+        raw_ip = socket.inet_pton(socket.AF_INET6, ip)
+    else:
+        raw_ip = b'\x00' * 10 + b'\xff\xff' + socket.inet_aton(ip)
+    return struct.pack('<IQ', timestamp, services) + raw_ip + struct.pack('>H', port)
+
+
+MIXED_ENTRIES = [
+    (1700000000, '203.0.113.5', 8333),
+    (1700000001, '2001:db8::1', 8333),
+    (1700000002, '198.51.100.7', 18333),
+    (1700000003, '::1', 8333),
+    (1700000004, '192.0.2.1', 8333)
+]
+
+
+class ParseAddrMessageTest(unittest.TestCase):
+    def test_keeps_ipv4_mapped_entries_only(self):
+        payload = varint_encode(len(MIXED_ENTRIES)) + b''.join(_addr_entry(*e) for e in MIXED_ENTRIES)
+        self.assertEqual(parse_addr_message(payload), [
+            ('203.0.113.5', 8333, 1700000000),
+            ('198.51.100.7', 18333, 1700000002),
+            ('192.0.2.1', 8333, 1700000004)
+        ])
+
+    def test_count_larger_than_payload_is_truncated(self):
+        entries = b''.join(_addr_entry(*e) for e in MIXED_ENTRIES[:3])
+        payload = varint_encode(10) + entries + entries[:15]
+        self.assertEqual(parse_addr_message(payload), [
+            ('203.0.113.5', 8333, 1700000000),
+            ('198.51.100.7', 18333, 1700000002)
+        ])
+
+    def test_empty_and_truncated_varint(self):
+        self.assertEqual(parse_addr_message(b''), [])
+        self.assertEqual(parse_addr_message(b'\xfd\x01'), [])
+
+
+class ParseMessageTest(unittest.TestCase):
+    def test_addr_round_trip(self):
+        payload = varint_encode(len(MIXED_ENTRIES)) + b''.join(_addr_entry(*e) for e in MIXED_ENTRIES)
+        frame = create_message(MSG_ADDR, payload)
+
+        command, parsed = parse_message(frame)
+
+        self.assertEqual(command, b'addr')
+        self.assertEqual(parsed, payload)
+        self.assertEqual([ip for ip, _, _ in parse_addr_message(parsed)], ['203.0.113.5', '198.51.100.7', '192.0.2.1'])
+
+    def test_incomplete_frame(self):
+        frame = create_message(MSG_ADDR, varint_encode(1) + _addr_entry(*MIXED_ENTRIES[0]))
+        self.assertIsNone(parse_message(frame[:HEADER_SIZE - 1]))
+        self.assertIsNone(parse_message(frame[:-1]))
+
+    def test_bad_checksum(self):
+        frame = bytearray(create_message(MSG_ADDR, varint_encode(1) + _addr_entry(*MIXED_ENTRIES[0])))
+        frame[-1] ^= 0xFF
+        self.assertIsNone(parse_message(bytes(frame)))
+
+
+if __name__ == '__main__':
+    unittest.main()
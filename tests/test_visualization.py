@@ -0,0 +1,125 @@
+import json
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+backend_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+sys.path.insert(0, backend_dir)
+
+from visualization import create_heatmap, export_nodes_json, heat_file_for, stats_file_for
+
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
+
+
+def _node(ip, latitude, longitude, country='United States', **extra):
+    node = {
+        'ip': ip,
+        'port': 8333,
+        'version': 70016,
+        'user_agent': '/Satoshi:27.0.0/',
+        'latitude': latitude,
+        'longitude': longitude,
+        'country': country,
+        'city': 'New York'
+    }
+    node.update(extra)
+    return node
+
+
+class ExportNodesJsonTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.json_file = os.path.join(self._tmp.name, 'bitcoin_nodes.json')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _export(self, nodes, **kwargs):
+        export_nodes_json(nodes, self.json_file, **kwargs)
+        with open(self.json_file, 'rb') as f:
+            return json.loads(f.read())
+
+    def test_drops_missing_and_out_of_range_coordinates(self):
+        nodes = [
+            _node('1.1.1.1', 40.7, -74.0),
+            _node('2.2.2.2', None, -74.0),
+            _node('3.3.3.3', 40.7, None),
+            _node('4.4.4.4', 91.0, 0.0),
+            _node('5.5.5.5', 0.0, -180.5),
+            _node('6.6.6.6', -90.0, 180.0)
+        ]
+        records = self._export(nodes, popups=False)
+        self.assertEqual([r['ip'] for r in records], ['1.1.1.1', '6.6.6.6'])
+
+    def test_popup_escapes_user_agent(self):
+        hostile = '/Satoshi:27.0.0/<img src=x onerror=alert(1)>'
+        records = self._export([_node('1.1.1.1', 40.7, -74.0, user_agent=hostile)])
+        self.assertEqual(set(records[0]), {'latitude', 'longitude', 'popup'})
+        popup = records[0]['popup']
+        self.assertNotIn('<img', popup)
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', popup)
+
+    def test_heat_bin_decodes_to_binned_triples(self):
+        nodes = [
+            _node('1.1.1.1', 40.1, -74.1),
+            _node('2.2.2.2', 39.9, -73.9),
+            _node('3.3.3.3', -33.76, 151.26)
+        ]
+        export_nodes_json(nodes, self.json_file)
+        with open(heat_file_for(self.json_file), 'rb') as f:
+            payload = f.read()
+        triples = sorted(struct.iter_unpack('<hhh', payload))
+        self.assertEqual(triples, [(-3400, 15150, 1), (4000, -7400, 2)])
+
+    def test_stats_file(self):
+        nodes = [
+            _node('1.1.1.1', 10.0, 20.0, country='Germany'),
+            _node('2.2.2.2', 30.0, -40.0, country='Germany'),
+            _node('3.3.3.3', 50.0, 50.0, country=None),
+            _node('4.4.4.4', None, 0.0, country='France')
+        ]
+        export_nodes_json(nodes, self.json_file)
+        with open(stats_file_for(self.json_file)) as f:
+            stats = json.load(f)
+        self.assertEqual(stats, {'count': 3, 'countries': 1, 'avg_lat': 30.0, 'avg_lon': 10.0})
+
+
+@unittest.skipIf(jinja2 is None, 'jinja2 is not installed')
+class CreateHeatmapTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_renders_page_pointing_at_exported_files(self):
+        output_file = os.path.join(self._tmp.name, 'index.html')
+        json_file = os.path.join(self._tmp.name, 'data', 'bitcoin_nodes.json')
+        os.makedirs(os.path.dirname(json_file))
+
+        result = create_heatmap([_node('1.1.1.1', 40.7, -74.0)], output_file, json_file, load_once=True)
+
+        self.assertEqual(result, output_file)
+        with open(output_file) as f:
+            page = f.read()
+        self.assertIn('"data/bitcoin_nodes.json"', page)
+        self.assertIn('"data/bitcoin_nodes.heat.bin"', page)
+        self.assertIn('"data/bitcoin_nodes.stats.json"', page)
+        self.assertNotIn('setInterval(fetchNodes', page)
+        self.assertTrue(os.path.exists(json_file + '.gz'))
+
+    def test_returns_none_without_valid_nodes(self):
+        output_file = os.path.join(self._tmp.name, 'index.html')
+        json_file = os.path.join(self._tmp.name, 'bitcoin_nodes.json')
+
+        self.assertIsNone(create_heatmap([_node('1.1.1.1', None, None)], output_file, json_file))
+        self.assertFalse(os.path.exists(output_file))
+
+
+if __name__ == '__main__':
+    unittest.main()